@@ -1,14 +1,71 @@
 """AI Agent for engaging scammers using Gemini."""
 
+import asyncio
+import hashlib
+import itertools
+from collections import OrderedDict
+
 import google.generativeai as genai
 from typing import List
+from .circuit_breaker import gemini_breaker
 from .config import GEMINI_API_KEY
+from .llm import PRIMARY_MODEL, BACKUP_MODEL, PRIMARY_TIMEOUT, BACKUP_TIMEOUT
 from .models import Message
 
+# Max entries in the exact-match response cache before FIFO eviction
+RESPONSE_CACHE_SIZE = 4096
+
+# Hard cap on generated reply length: ~50 words is about 60 tokens, and
+# anything past the 200-char trim is paid-for output we throw away
+MAX_REPLY_TOKENS = 60
+# Stop consuming the stream once this much text has accumulated
+STREAM_CUTOFF_CHARS = 220
+
+# Prompt template built once at import: the static role/rules block stays
+# byte-identical across calls (prefix-cache friendly) and format_map fills
+# only the dynamic tail instead of rebuilding the whole string as an
+# f-string each turn
+_PROMPT_TEMPLATE = """You are role-playing as a potential scam victim to keep the scammer engaged and extract information.
+
+CRITICAL RULES:
+1. NEVER reveal you know this is a scam
+2. Be believable as a real human - use natural language
+3. Keep responses SHORT (1-2 sentences, max 50 words)
+4. Your goal: Keep them talking to extract phone numbers, links, account details, UPI IDs
+5. Act confused, worried, or naive to seem like an easy target
+
+---
+SCAM TYPE: {scam_type}
+
+{context_block}SCAMMER'S MESSAGE: "{scammer_message}"
+
+Generate a single, natural response that keeps the scammer engaged.
+YOUR RESPONSE (just the message, no quotes):"""
+
+# Optional: semantic cache catches paraphrased scam templates that the
+# exact-match cache misses ("your account is blocked" vs "acc blocked urgent")
+try:
+    import faiss
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    SEMANTIC_CACHE_AVAILABLE = True
+except ImportError:
+    SEMANTIC_CACHE_AVAILABLE = False
+
+# Cosine similarity above which a prior reply is reused
+SEMANTIC_CACHE_THRESHOLD = 0.92
+# Max cached embeddings before the oldest half is dropped
+SEMANTIC_CACHE_SIZE = 50000
+# Entries to accumulate before training the int8 quantizer: fp32 vectors
+# cost 1.5KB each and linear search is memory-bound, so quantizing to
+# int8 cuts both footprint and scan bandwidth 4x with negligible recall
+# loss at the 0.92 threshold
+SEMANTIC_TRAIN_THRESHOLD = 1000
+
 
 # Fallback prompts to extract scammer details when LLM is unavailable
 # These cycle in sequence to keep the scammer engaged
-FALLBACK_PROMPTS = [
+FALLBACK_PROMPTS = (
     "Oh really? Can you tell me more? What number should I call you on?",
     "I'm interested! But I'm confused, can you send me the link again?",
     "Wait, which bank account should I transfer to? Can you share the details?",
@@ -24,7 +81,7 @@ FALLBACK_PROMPTS = [
     "I trust you! Just tell me where to send money - UPI, account, anything works!",
     "My eyes are weak, can you call me and explain? Share your number please.",
     "I'm convinced! Send me all the payment details - account, UPI, or link.",
-]
+)
 
 
 class HoneypotAgent:
@@ -32,22 +89,134 @@ class HoneypotAgent:
     
     def __init__(self):
         self._setup_llm()
-        self.fallback_index = 0  # Track which fallback prompt to use next
+        self._fallback_iter = itertools.cycle(FALLBACK_PROMPTS)
+        # Exact-match response cache: scam campaigns reuse templates verbatim,
+        # so identical prompts can skip the multi-second Gemini round trip
+        self._response_cache: OrderedDict[str, tuple[str, str]] = OrderedDict()
+        self._cache_lock = asyncio.Lock()
+        # Single-flight: concurrent identical misses share one generation
+        # instead of each paying (and billing) its own Gemini call
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _cache_key(scammer_message: str, history: List[Message], scam_type: str) -> str:
+        """Build a cache key from the message, scam type, and recent history."""
+        history_tail = "".join(m.text for m in history[-3:])
+        raw = f"{scam_type}|{scammer_message}|{history_tail}"
+        return hashlib.sha256(raw.encode()).hexdigest()
     
     def _setup_llm(self):
-        """Initialize Gemini LLM."""
+        """Initialize Gemini LLM and the optional semantic cache."""
         if GEMINI_API_KEY:
             genai.configure(api_key=GEMINI_API_KEY)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
+            self.model = genai.GenerativeModel(PRIMARY_MODEL)
+            self.backup_model = genai.GenerativeModel(BACKUP_MODEL)
             self.llm_available = True
         else:
             self.llm_available = False
-    
+
+        self.semantic_cache_enabled = SEMANTIC_CACHE_AVAILABLE
+        if self.semantic_cache_enabled:
+            self._embedder = SentenceTransformer('all-MiniLM-L6-v2')
+            # Flat fp32 index until enough entries accumulate to train
+            # the int8 scalar quantizer (see _quantize_index)
+            self._semantic_index = faiss.IndexFlatIP(384)
+            self._semantic_quantized = False
+            self._semantic_vectors: list = []
+            self._semantic_replies: list[tuple[str, str]] = []
+
+    def _quantize_index(self) -> None:
+        """Swap the flat fp32 index for an int8 scalar-quantized one."""
+        vecs = np.vstack(self._semantic_vectors)
+        index = faiss.IndexScalarQuantizer(
+            384, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(vecs)
+        index.add(vecs)
+        self._semantic_index = index
+        self._semantic_quantized = True
+
+    def _semantic_lookup(self, scammer_message: str) -> tuple[str, str] | None:
+        """Return a cached reply for a near-duplicate message, if any."""
+        if not self.semantic_cache_enabled or self._semantic_index.ntotal == 0:
+            return None
+        vec = self._embedder.encode([scammer_message], normalize_embeddings=True)
+        scores, indices = self._semantic_index.search(vec.astype(np.float32), 1)
+        if scores[0][0] > SEMANTIC_CACHE_THRESHOLD:
+            return self._semantic_replies[indices[0][0]]
+        return None
+
+    def _semantic_store(self, scammer_message: str, reply: str, note: str) -> None:
+        """Add a generated reply to the semantic cache."""
+        if not self.semantic_cache_enabled:
+            return
+        if len(self._semantic_replies) >= SEMANTIC_CACHE_SIZE:
+            # Drop the oldest half and rebuild the index
+            keep = SEMANTIC_CACHE_SIZE // 2
+            self._semantic_vectors = self._semantic_vectors[-keep:]
+            self._semantic_replies = self._semantic_replies[-keep:]
+            self._semantic_index.reset()
+            self._semantic_index.add(np.vstack(self._semantic_vectors))
+        vec = self._embedder.encode([scammer_message], normalize_embeddings=True)
+        vec = vec.astype(np.float32)
+        self._semantic_index.add(vec)
+        self._semantic_vectors.append(vec)
+        self._semantic_replies.append((reply, note))
+        if (not self._semantic_quantized
+                and len(self._semantic_replies) >= SEMANTIC_TRAIN_THRESHOLD):
+            self._quantize_index()
+
+    async def _generate_streaming(self, prompt: str) -> str:
+        """
+        Stream the reply and stop consuming tokens once enough text has
+        arrived. Generation is O(N) in output tokens, so cutting the
+        stream at the trim point saves both decode latency and billing.
+        """
+        config = {"max_output_tokens": MAX_REPLY_TOKENS}
+        try:
+            stream = await asyncio.wait_for(
+                self.model.generate_content_async(
+                    prompt, stream=True, generation_config=config
+                ),
+                timeout=PRIMARY_TIMEOUT,
+            )
+        except Exception as e:
+            print(f"Primary model failed ({e}); cascading to {BACKUP_MODEL}")
+            stream = await asyncio.wait_for(
+                self.backup_model.generate_content_async(
+                    prompt, stream=True, generation_config=config
+                ),
+                timeout=BACKUP_TIMEOUT,
+            )
+
+        acc = ""
+        async for chunk in stream:
+            acc += chunk.text
+            if len(acc) > STREAM_CUTOFF_CHARS:
+                if hasattr(stream, "aclose"):
+                    await stream.aclose()
+                break
+        return acc
+
     def _get_fallback_response(self) -> tuple[str, str]:
         """Get the next fallback response in sequence."""
-        response = FALLBACK_PROMPTS[self.fallback_index]
-        self.fallback_index = (self.fallback_index + 1) % len(FALLBACK_PROMPTS)
-        return response, "LLM unavailable - using fallback prompt"
+        return next(self._fallback_iter), "LLM unavailable - using fallback prompt"
+
+    @staticmethod
+    def _build_prompt(scammer_message: str, history: List[Message],
+                      scam_type: str) -> str:
+        """Fill the dynamic tail of the precomputed prompt template."""
+        context_block = ""
+        if history:
+            recent = history[-6:]
+            context = "\n".join([f"{'Caller' if m.sender == 'scammer' else 'You'}: {m.text}"
+                                for m in recent])
+            context_block = f"CONVERSATION SO FAR:\n{context}\n\n"
+        return _PROMPT_TEMPLATE.format_map({
+            "scam_type": scam_type,
+            "context_block": context_block,
+            "scammer_message": scammer_message,
+        })
     
     async def generate_response(self, scammer_message: str, history: List[Message],
                                 scam_type: str, message_count: int) -> tuple[str, str]:
@@ -59,41 +228,69 @@ class HoneypotAgent:
         """
         if not self.llm_available:
             return self._get_fallback_response()
-        
-        # Build conversation context
-        context = ""
-        if history:
-            recent = history[-6:]
-            context = "\n".join([f"{'Caller' if m.sender == 'scammer' else 'You'}: {m.text}" 
-                                for m in recent])
-        
-        prompt = f"""You are role-playing as a potential scam victim to keep the scammer engaged and extract information.
 
-CRITICAL RULES:
-1. NEVER reveal you know this is a scam
-2. Be believable as a real human - use natural language
-3. Keep responses SHORT (1-2 sentences, max 50 words)
-4. Your goal: Keep them talking to extract phone numbers, links, account details, UPI IDs
-5. Act confused, worried, or naive to seem like an easy target
+        cache_key = self._cache_key(scammer_message, history, scam_type)
+        async with self._cache_lock:
+            if cache_key in self._response_cache:
+                self._response_cache.move_to_end(cache_key)
+                reply, _ = self._response_cache[cache_key]
+                return reply, f"Cached response | Scam type: {scam_type}"
+            waiter = self._inflight.get(cache_key)
+            if waiter is None:
+                # First miss for this key: own the generation; concurrent
+                # identical requests below await this future instead
+                self._inflight[cache_key] = asyncio.get_running_loop().create_future()
 
-SCAM TYPE: {scam_type}
+        if waiter is not None:
+            reply, _ = await waiter
+            return reply, f"Coalesced with in-flight request | Scam type: {scam_type}"
 
-{f"CONVERSATION SO FAR:\n{context}" if context else ""}
+        # _generate_uncached handles its own errors and always returns a
+        # reply; resolve the future even if we get cancelled so waiters
+        # never hang
+        result = None
+        try:
+            result = await self._generate_uncached(
+                scammer_message, history, scam_type, cache_key
+            )
+        finally:
+            async with self._cache_lock:
+                future = self._inflight.pop(cache_key, None)
+            if future is not None and not future.done():
+                if result is not None:
+                    future.set_result(result)
+                else:
+                    future.cancel()
+        return result
 
-SCAMMER'S MESSAGE: "{scammer_message}"
+    async def _generate_uncached(self, scammer_message: str, history: List[Message],
+                                 scam_type: str, cache_key: str) -> tuple[str, str]:
+        """Generate, cache, and return a reply for a confirmed cache miss."""
+        semantic_hit = self._semantic_lookup(scammer_message)
+        if semantic_hit is not None:
+            reply, _ = semantic_hit
+            return reply, f"Semantic cache hit | Scam type: {scam_type}"
 
-Generate a single, natural response that keeps the scammer engaged.
-YOUR RESPONSE (just the message, no quotes):"""
+        prompt = self._build_prompt(scammer_message, history, scam_type)
 
         try:
-            response = await self.model.generate_content_async(prompt)
-            reply = response.text.strip().strip('"\'')
-            
+            async with gemini_breaker:
+                raw_reply = await self._generate_streaming(prompt)
+            reply = raw_reply.strip().strip('"\'')
+
             if len(reply) > 200:
                 reply = reply[:200].rsplit(' ', 1)[0] + "..."
-            
-            return reply, f"Generated via Gemini | Scam type: {scam_type}"
-            
+
+            note = f"Generated via Gemini | Scam type: {scam_type}"
+            async with self._cache_lock:
+                self._response_cache[cache_key] = (reply, note)
+                self._response_cache.move_to_end(cache_key)
+                if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
+            self._semantic_store(scammer_message, reply, note)
+
+            return reply, note
+
         except Exception as e:
             print(f"Agent error: {e}")
             response, _ = self._get_fallback_response()
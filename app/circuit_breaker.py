@@ -0,0 +1,56 @@
+"""Circuit breaker for outbound Gemini calls."""
+
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit is open and the call is short-circuited."""
+
+
+class CircuitBreaker:
+    """
+    Async-context-manager circuit breaker.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    every call raises CircuitOpenError immediately instead of waiting out
+    the provider's full timeout. After `reset_timeout` seconds one probe
+    call is let through (half-open); success closes the breaker again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently being short-circuited."""
+        return (self._failures >= self.failure_threshold
+                and time.monotonic() - self._opened_at < self.reset_timeout)
+
+    async def __aenter__(self):
+        if self._failures >= self.failure_threshold:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError("circuit open - short-circuiting to fallback")
+            # Reset timeout elapsed: half-open, let this probe call through
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._failures = 0
+        elif (issubclass(exc_type, Exception)
+                and not issubclass(exc_type, CircuitOpenError)):
+            # Only provider errors count. CancelledError (a client
+            # disconnect tearing down the request task) and other
+            # BaseExceptions say nothing about the provider's health
+            # and must not open the breaker.
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+        return False
+
+
+# Shared breaker for all Gemini calls: detector, agent, and orchestrator
+# talk to the same provider, so they should trip together
+gemini_breaker = CircuitBreaker()
@@ -15,6 +15,12 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 # Engagement threshold (number of messages before sending callback)
 ENGAGEMENT_THRESHOLD = int(os.getenv("ENGAGEMENT_THRESHOLD", "10"))
 
+# GUVI callback endpoint (callback disabled when unset)
+GUVI_CALLBACK_URL = os.getenv("GUVI_CALLBACK_URL", "")
+
+# Redis connection for caches shared across workers (disabled when unset)
+REDIS_URL = os.getenv("REDIS_URL", "")
+
 # Scam detection keywords
 SCAM_KEYWORDS = [
     "lottery", "prize", "won", "winner", "claim", "bank", "account", "transfer",
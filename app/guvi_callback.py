@@ -0,0 +1,76 @@
+"""GUVI callback delivery for completed engagements."""
+
+import asyncio
+
+import httpx
+from .config import GUVI_CALLBACK_URL
+from .models import GuviCallbackPayload
+
+# Optional: orjson is several times faster than stdlib json for the nested
+# list fields in ExtractedIntelligence
+try:
+    import orjson
+
+    def _serialize(payload: GuviCallbackPayload) -> bytes:
+        return orjson.dumps(payload.model_dump())
+except ImportError:
+    def _serialize(payload: GuviCallbackPayload) -> bytes:
+        return payload.model_dump_json().encode()
+
+# Optional: httpx only speaks HTTP/2 when the h2 package is installed and
+# raises at client construction otherwise, so probe for it and fall back
+# to HTTP/1.1 (keep-alive pooling still applies) when it is missing
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Number of delivery attempts before giving up
+MAX_RETRIES = 3
+
+# Module-level singleton client: keep-alive pooling plus HTTP/2 amortizes
+# the DNS + TCP + TLS handshake across calls instead of paying it per send
+_client = httpx.AsyncClient(
+    http2=HTTP2_AVAILABLE,
+    timeout=10.0,
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+)
+
+
+async def send_guvi_callback(payload: GuviCallbackPayload) -> bool:
+    """
+    POST the callback payload to GUVI, retrying with exponential backoff.
+
+    Returns:
+        True if the callback was delivered successfully.
+    """
+    if not GUVI_CALLBACK_URL:
+        return False
+
+    # Serialize once - the payload does not change between retries
+    body = _serialize(payload)
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            response = await _client.post(
+                GUVI_CALLBACK_URL,
+                content=body,
+                headers={"Content-Type": "application/json"},
+            )
+            if response.status_code < 400:
+                return True
+            print(f"GUVI callback attempt {attempt + 1} failed: HTTP {response.status_code}")
+        except httpx.HTTPError as e:
+            print(f"GUVI callback attempt {attempt + 1} failed: {e}")
+
+        if attempt < MAX_RETRIES - 1:
+            # Exponential backoff so retries do not synchronize
+            await asyncio.sleep(0.25 * 2 ** attempt)
+
+    return False
+
+
+async def close_client() -> None:
+    """Close the pooled client (call on application shutdown)."""
+    await _client.aclose()
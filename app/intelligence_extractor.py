@@ -1,108 +1,290 @@
 """Intelligence extraction from conversations."""
 
 import re
-from typing import List, Set
+from functools import lru_cache
+from typing import List, Tuple
 from .models import ExtractedIntelligence, Message
 from .config import SCAM_KEYWORDS
 
+# Optional: google-re2 is a lazy-DFA engine with guaranteed linear-time
+# matching - no pathological backtracking on adversarial scammer input
+try:
+    import re2 as _re2
+    RE2_AVAILABLE = True
+except ImportError:
+    _re2 = None
+    RE2_AVAILABLE = False
+
+# Optional: the third-party regex module sits between RE2 and stdlib re
+# in the fallback chain - still backtracking, but with a faster matcher
+# on character-class-heavy patterns like the URL one
+try:
+    import regex as _regex
+    REGEX_AVAILABLE = True
+except ImportError:
+    _regex = None
+    REGEX_AVAILABLE = False
+
+# Engine preference order; stdlib re stays last as the guaranteed baseline
+_ENGINES = [e for e in (_re2, _regex) if e is not None]
+
+
+def _compile(pattern: str, flags: int = 0):
+    """Compile with the fastest available engine: RE2 (linear-time DFA),
+    then the third-party regex module, then stdlib re. Each stage also
+    catches patterns the preceding engine rejects."""
+    for engine in _ENGINES:
+        try:
+            return engine.compile(pattern, flags)
+        except Exception:
+            continue
+    return re.compile(pattern, flags)
+
+
+# URL classification literals, frozen at import and scanned via compiled
+# alternations instead of a Python any()-loop per URL
+SUSPICIOUS_INDICATORS = frozenset({
+    'bit.ly', 'tinyurl', 'goo.gl', 't.co',  # URL shorteners
+    'login', 'verify', 'update', 'secure',  # Phishing keywords
+    '.xyz', '.tk', '.ml', '.ga', '.cf',  # Suspicious TLDs
+    'bank', 'upi', 'payment'  # Financial keywords
+})
+SAFE_DOMAINS = frozenset({'google.com', 'microsoft.com', 'apple.com'})
+EMAIL_DOMAINS = frozenset({'gmail', 'yahoo', 'hotmail', 'outlook', 'email'})
+
+_SUSPICIOUS_RE = _compile('|'.join(map(re.escape, sorted(SUSPICIOUS_INDICATORS))))
+_SAFE_RE = _compile('|'.join(map(re.escape, sorted(SAFE_DOMAINS))))
+_EMAIL_RE = _compile('|'.join(map(re.escape, sorted(EMAIL_DOMAINS))))
+
+# Every structural pattern needs a digit, an '@', or an 'h' (http) to
+# match, so one cheap character-class probe can rule them all out
+_TRIGGER_RE = re.compile(r'[0-9@hH]')
+
+# Compiled once: phone normalization runs per match, and re.sub with a
+# string pattern pays a cache lookup on every call
+_PHONE_CLEAN = re.compile(r'[\s\-]')
+
+# Optional: Hyperscan compiles the whole pattern set into one SIMD
+# multi-pattern scanner. It cannot report capture groups, so it serves as
+# a block-mode prefilter: messages with no match at all (the common case
+# for benign chatter) skip the Python regex pass entirely.
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+# Optional: pyahocorasick finds every keyword in one linear DFA pass,
+# O(N + matches) instead of one scan per keyword (same fallback story as
+# the ScamDetector's matcher)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 
 class IntelligenceExtractor:
     """Extracts actionable intelligence from scam conversations."""
     
     # Regex patterns for intelligence extraction
-    BANK_ACCOUNT_PATTERN = re.compile(r'\b\d{9,18}\b')
-    UPI_ID_PATTERN = re.compile(r'[a-zA-Z0-9._-]+@[a-zA-Z0-9]+', re.IGNORECASE)
-    PHONE_PATTERN = re.compile(r'(\+91[\-\s]?)?[789]\d{9}\b')
-    URL_PATTERN = re.compile(r'https?://[^\s<>"\'{}|\\^`\[\]]+', re.IGNORECASE)
-    
+    BANK_ACCOUNT_PATTERN = _compile(r'\b\d{9,18}\b')
+    UPI_ID_PATTERN = _compile(r'[a-zA-Z0-9._-]+@[a-zA-Z0-9]+', re.IGNORECASE)
+    PHONE_PATTERN = _compile(r'(\+91[\-\s]?)?[789]\d{9}\b')
+    URL_PATTERN = _compile(r'https?://[^\s<>"\'{}|\\^`\[\]]+', re.IGNORECASE)
+
+    # All four patterns fused into one alternation so extract_from_text
+    # makes a single linear pass per message. Order matters: links consume
+    # embedded UPI-like tokens, and phones win over bare account digits.
+    COMBINED_PATTERN_SOURCE = (
+        r'(?P<link>https?://[^\s<>"\'{}|\\^`\[\]]+)'
+        r'|(?P<upi>[a-zA-Z0-9._-]+@[a-zA-Z0-9]+)'
+        r'|(?P<phone>(?:\+91[\-\s]?)?[789]\d{9}\b)'
+        r'|(?P<acct>\b\d{9,18}\b)'
+    )
+    COMBINED_PATTERN = _compile(COMBINED_PATTERN_SOURCE, re.IGNORECASE)
+
     def __init__(self):
         self.scam_keywords = set(kw.lower() for kw in SCAM_KEYWORDS)
+        # One compiled alternation scans the text once instead of one
+        # substring pass per keyword
+        keyword_alternation = "|".join(
+            re.escape(kw) for kw in sorted(self.scam_keywords)
+        )
+        self._keyword_regex = re.compile(keyword_alternation)
+        if AHOCORASICK_AVAILABLE:
+            self._keyword_automaton = ahocorasick.Automaton()
+            for kw in self.scam_keywords:
+                self._keyword_automaton.add_word(kw, kw)
+            self._keyword_automaton.make_automaton()
+        else:
+            self._keyword_automaton = None
+        self._hs_db = None
+        if HYPERSCAN_AVAILABLE:
+            expressions = [
+                rb'https?://[^\s<>"\'{}|\\^`\[\]]+',
+                rb'[a-zA-Z0-9._-]+@[a-zA-Z0-9]+',
+                rb'(?:\+91[\-\s]?)?[789][0-9]{9}\b',
+                rb'\b[0-9]{9,18}\b',
+                keyword_alternation.encode(),
+            ]
+            try:
+                self._hs_db = hyperscan.Database()
+                self._hs_db.compile(
+                    expressions=expressions,
+                    ids=list(range(len(expressions))),
+                    flags=[hyperscan.HS_FLAG_CASELESS] * len(expressions),
+                )
+            except Exception as e:
+                print(f"Hyperscan compile failed, prefilter disabled: {e}")
+                self._hs_db = None
+        # Memoize per-message results: scammers reuse canned phrases across
+        # sessions, and repeat texts then skip the scan entirely. The cache
+        # is bound per instance so it holds plain tuples, not models.
+        self._extract_cached = lru_cache(maxsize=4096)(self._extract_uncached)
+
+    def _might_contain_intel(self, text: str) -> bool:
+        """Hyperscan prefilter: False only when no pattern matches at all."""
+        if self._hs_db is None:
+            return True
+        hits = []
+
+        def on_match(pattern_id, start, end, flags, context=None):
+            hits.append(pattern_id)
+            return 1  # any hit is enough - terminate the scan
+
+        try:
+            self._hs_db.scan(text.encode(), match_event_handler=on_match)
+        except Exception:
+            return True  # scanner error: fall through to the regex pass
+        return bool(hits)
     
+    @staticmethod
+    def _is_bank_account(match: str) -> bool:
+        """Filter out common non-account numbers (timestamps, etc.)."""
+        return len(match) >= 10 and not match.startswith('20')
+
+    @staticmethod
+    def _is_upi_id(match: str) -> bool:
+        """Filter out email addresses."""
+        return _EMAIL_RE.search(match.lower()) is None
+
+    @staticmethod
+    def _clean_phone(match: str) -> str:
+        """Normalize a phone match to +91XXXXXXXXXX form."""
+        clean = _PHONE_CLEAN.sub('', match)
+        if not clean.startswith('+91'):
+            clean = '+91' + clean[-10:]
+        return clean
+
+    @staticmethod
+    def _is_phishing_link(url: str) -> bool:
+        """Flag suspicious URL patterns."""
+        url_lower = url.lower()
+        if _SUSPICIOUS_RE.search(url_lower):
+            return True
+        return _SAFE_RE.search(url_lower) is None
+
     def extract_bank_accounts(self, text: str) -> List[str]:
         """Extract potential bank account numbers."""
         matches = self.BANK_ACCOUNT_PATTERN.findall(text)
-        # Filter out common non-account numbers (timestamps, etc.)
-        return [m for m in matches if len(m) >= 10 and not m.startswith('20')]
-    
+        return [m for m in matches if self._is_bank_account(m)]
+
     def extract_upi_ids(self, text: str) -> List[str]:
         """Extract UPI IDs (format: name@bank)."""
         matches = self.UPI_ID_PATTERN.findall(text)
-        # Filter out email addresses
-        return [m for m in matches if not any(domain in m.lower() for domain in 
-                ['gmail', 'yahoo', 'hotmail', 'outlook', 'email'])]
-    
+        return [m for m in matches if self._is_upi_id(m)]
+
     def extract_phone_numbers(self, text: str) -> List[str]:
         """Extract Indian phone numbers."""
-        matches = self.PHONE_PATTERN.findall(text)
-        # Clean and format
-        cleaned = []
-        for match in matches:
-            if isinstance(match, tuple):
-                match = ''.join(match)
-            clean = re.sub(r'[\s\-]', '', match)
-            if not clean.startswith('+91'):
-                clean = '+91' + clean[-10:]
-            cleaned.append(clean)
-        return cleaned
-    
+        return [self._clean_phone(m.group())
+                for m in self.PHONE_PATTERN.finditer(text)]
+
     def extract_phishing_links(self, text: str) -> List[str]:
         """Extract suspicious URLs."""
         matches = self.URL_PATTERN.findall(text)
-        suspicious = []
-        for url in matches:
-            # Flag suspicious patterns
-            suspicious_indicators = [
-                'bit.ly', 'tinyurl', 'goo.gl', 't.co',  # URL shorteners
-                'login', 'verify', 'update', 'secure',  # Phishing keywords
-                '.xyz', '.tk', '.ml', '.ga', '.cf',  # Suspicious TLDs
-                'bank', 'upi', 'payment'  # Financial keywords
-            ]
-            if any(ind in url.lower() for ind in suspicious_indicators):
-                suspicious.append(url)
-            elif not any(safe in url.lower() for safe in ['google.com', 'microsoft.com', 'apple.com']):
-                suspicious.append(url)
-        return suspicious
-    
-    def extract_suspicious_keywords(self, text: str) -> List[str]:
+        return [url for url in matches if self._is_phishing_link(url)]
+
+    def extract_suspicious_keywords(self, text: str, text_lower: str = None) -> List[str]:
         """Extract suspicious keywords from text."""
-        text_lower = text.lower()
-        found = []
-        for keyword in self.scam_keywords:
-            if keyword in text_lower:
-                found.append(keyword)
-        return found
+        if text_lower is None:
+            text_lower = text.lower()
+        if self._keyword_automaton is not None:
+            return list({kw for _, kw in self._keyword_automaton.iter(text_lower)})
+        return list(set(self._keyword_regex.findall(text_lower)))
     
+    def _extract_uncached(self, text: str) -> Tuple[tuple, tuple, tuple, tuple, tuple]:
+        """Run the fused scan, returning hashable tuples for the cache."""
+        accounts: List[str] = []
+        upis: List[str] = []
+        links: List[str] = []
+        phones: List[str] = []
+
+        for match in self.COMBINED_PATTERN.finditer(text):
+            value = match.group()
+            group = match.lastgroup
+            if group == 'link':
+                if self._is_phishing_link(value):
+                    links.append(value)
+            elif group == 'upi':
+                if self._is_upi_id(value):
+                    upis.append(value)
+            elif group == 'phone':
+                phones.append(self._clean_phone(value))
+            elif group == 'acct':
+                if self._is_bank_account(value):
+                    accounts.append(value)
+
+        # Keywords get their own linear pass: folded into the structural
+        # alternation they get swallowed whenever they appear inside a
+        # link or UPI match ("verify" in a phishing URL), losing hits
+        keywords = self.extract_suspicious_keywords(text)
+
+        return tuple(accounts), tuple(upis), tuple(links), tuple(phones), tuple(keywords)
+
     def extract_from_text(self, text: str) -> ExtractedIntelligence:
-        """Extract all intelligence from a single text."""
-        return ExtractedIntelligence(
-            bankAccounts=self.extract_bank_accounts(text),
-            upiIds=self.extract_upi_ids(text),
-            phishingLinks=self.extract_phishing_links(text),
-            phoneNumbers=self.extract_phone_numbers(text),
-            suspiciousKeywords=self.extract_suspicious_keywords(text)
+        """Extract all intelligence from a single text in one regex pass."""
+        # model_construct skips pydantic validation: every field here is a
+        # list of str we built ourselves, so validating it per request is
+        # pure overhead on the hottest allocation in the endpoint
+        if _TRIGGER_RE.search(text) is None:
+            # No candidate bytes for links, UPI IDs, or numbers - only the
+            # keyword scan can still hit plain words
+            return ExtractedIntelligence.model_construct(
+                suspiciousKeywords=self.extract_suspicious_keywords(text)
+            )
+        if not self._might_contain_intel(text):
+            return ExtractedIntelligence.model_construct()
+
+        accounts, upis, links, phones, keywords = self._extract_cached(text)
+        return ExtractedIntelligence.model_construct(
+            bankAccounts=list(accounts),
+            upiIds=list(upis),
+            phishingLinks=list(links),
+            phoneNumbers=list(phones),
+            suspiciousKeywords=list(keywords)
         )
     
     def extract_from_conversation(self, messages: List[Message]) -> ExtractedIntelligence:
         """Extract intelligence from entire conversation history."""
-        combined = ExtractedIntelligence()
-        
-        for message in messages:
-            if message.sender == "scammer":
-                intel = self.extract_from_text(message.text)
-                combined.bankAccounts.extend(intel.bankAccounts)
-                combined.upiIds.extend(intel.upiIds)
-                combined.phishingLinks.extend(intel.phishingLinks)
-                combined.phoneNumbers.extend(intel.phoneNumbers)
-                combined.suspiciousKeywords.extend(intel.suspiciousKeywords)
-        
-        # Remove duplicates
-        combined.bankAccounts = list(set(combined.bankAccounts))
-        combined.upiIds = list(set(combined.upiIds))
-        combined.phishingLinks = list(set(combined.phishingLinks))
-        combined.phoneNumbers = list(set(combined.phoneNumbers))
-        combined.suspiciousKeywords = list(set(combined.suspiciousKeywords))
-        
-        return combined
+        # One scan over the whole batch instead of one per message: the
+        # regex engine amortizes setup across a single big input. Newlines
+        # separate messages - they break URL runs, sit outside every
+        # pattern's character classes, and preserve \b anchors.
+        big = '\n'.join(m.text for m in messages if m.sender == "scammer")
+        if not big:
+            return ExtractedIntelligence.model_construct()
+
+        intel = self.extract_from_text(big)
+
+        # Remove duplicates, preserving first-seen order
+        intel.bankAccounts = list(dict.fromkeys(intel.bankAccounts))
+        intel.upiIds = list(dict.fromkeys(intel.upiIds))
+        intel.phishingLinks = list(dict.fromkeys(intel.phishingLinks))
+        intel.phoneNumbers = list(dict.fromkeys(intel.phoneNumbers))
+        intel.suspiciousKeywords = list(dict.fromkeys(intel.suspiciousKeywords))
+
+        return intel
 
 
 # Global instance
@@ -0,0 +1,37 @@
+"""Gemini model cascade shared by the detector, agent, and orchestrator."""
+
+import asyncio
+
+# Primary model, and the cheaper/faster backup tried when the primary
+# times out or errors - before any static fallback prompt
+PRIMARY_MODEL = 'gemini-1.5-flash'
+BACKUP_MODEL = 'gemini-2.0-flash-lite'
+
+# Seconds to wait on the primary before pre-empting it
+PRIMARY_TIMEOUT = 2.0
+# Hard deadline on the backup: a hung provider must fail fast enough to
+# reach the static fallback and register with the circuit breaker,
+# instead of holding every request for the SDK's default deadline
+BACKUP_TIMEOUT = 5.0
+
+
+async def generate_with_cascade(primary, backup, prompt, generation_config=None):
+    """
+    Try the primary model with a hard timeout, then fall back to the
+    backup model under its own deadline. Clips the p99: slow primary
+    requests get pre-empted instead of holding the turn for the
+    provider's full timeout.
+
+    Raises the backup's exception (or TimeoutError) if both models fail.
+    """
+    try:
+        return await asyncio.wait_for(
+            primary.generate_content_async(prompt, generation_config=generation_config),
+            timeout=PRIMARY_TIMEOUT,
+        )
+    except Exception as e:
+        print(f"Primary model failed ({e}); cascading to {BACKUP_MODEL}")
+        return await asyncio.wait_for(
+            backup.generate_content_async(prompt, generation_config=generation_config),
+            timeout=BACKUP_TIMEOUT,
+        )
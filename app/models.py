@@ -1,9 +1,14 @@
 """Pydantic models for request/response validation."""
 
-from typing import List, Optional, Union
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set, Union
 from pydantic import BaseModel, Field
 from datetime import datetime
 
+# Max messages retained per session; older ones are evicted in O(1)
+MAX_HISTORY_MESSAGES = 50
+
 
 class Message(BaseModel):
     """Individual message structure."""
@@ -12,6 +17,25 @@ class Message(BaseModel):
     timestamp: Union[int, str] = Field(..., description="Epoch timestamp (ms) or ISO-8601 string")
 
 
+@dataclass(slots=True, frozen=True)
+class MessageRec:
+    """
+    Compact immutable message record for session history storage.
+
+    Incoming messages are validated as pydantic Message models on ingress,
+    then stored as slotted dataclasses: sessions hold dozens of these and
+    a slotted record is several times smaller than a BaseModel instance.
+    """
+    sender: str
+    text: str
+    timestamp: Union[int, str]
+
+    @classmethod
+    def from_message(cls, message: "Message") -> "MessageRec":
+        return cls(sender=message.sender, text=message.text,
+                   timestamp=message.timestamp)
+
+
 class Metadata(BaseModel):
     """Message metadata."""
     channel: Optional[str] = Field("SMS", description="Communication channel")
@@ -65,6 +89,12 @@ class SessionData(BaseModel):
     scam_type: Optional[str] = None
     confidence: float = 0.0
     intelligence: ExtractedIntelligence = Field(default_factory=ExtractedIntelligence)
-    conversation_history: List[Message] = Field(default_factory=list)
+    conversation_history: Deque[MessageRec] = Field(
+        default_factory=lambda: deque(maxlen=MAX_HISTORY_MESSAGES)
+    )
+    window_start: int = 0
+    # 64-bit signatures of already-merged intelligence items, one set per
+    # bucket: dedup membership tests hash an 8-byte int, not the string
+    intel_seen: Dict[str, Set[int]] = Field(default_factory=dict)
     callback_sent: bool = False
     agent_notes: List[str] = Field(default_factory=list)
@@ -0,0 +1,213 @@
+"""Fused scam detection + response generation in one Gemini call."""
+
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+
+import google.generativeai as genai
+from typing import List
+from .circuit_breaker import gemini_breaker
+from .config import GEMINI_API_KEY, REDIS_URL
+from .llm import PRIMARY_MODEL, BACKUP_MODEL, generate_with_cascade
+from .models import Message
+from .scam_detector import scam_detector
+from .agent import honeypot_agent
+
+# Optional: Redis shares the fused cache across worker processes, same
+# pattern as the detector's verdict cache
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Max entries in the in-process fused result cache before LRU eviction
+FUSED_CACHE_SIZE = 4096
+# Fused verdicts+replies for a given message barely change; keep them a day
+FUSED_CACHE_TTL = 86400
+
+
+# Static prompt sections come first and are byte-identical across calls so
+# the provider's exact-prefix cache can reuse them; everything dynamic
+# (scam type, context, message) goes in the tail appended per call.
+_STATIC_HEADER = """You are role-playing as a potential scam victim to keep the scammer engaged and extract information, while also classifying the message.
+
+CRITICAL RULES:
+1. NEVER reveal you know this is a scam
+2. Be believable as a real human - use natural language
+3. Keep the reply SHORT (1-2 sentences, max 50 words)
+4. Your goal: Keep them talking to extract phone numbers, links, account details, UPI IDs
+5. Act confused, worried, or naive to seem like an easy target
+
+Respond with a JSON object with exactly these keys:
+{"is_scam": true/false, "confidence": 0.0-1.0, "scam_type": "bank_fraud/upi_fraud/phishing/fake_offer/unknown", "reply": "your in-character response"}"""
+
+
+class HoneypotOrchestrator:
+    """
+    Runs scam detection and victim-role response generation as a single
+    structured-output Gemini call.
+
+    The detector and agent previously each shipped the same history and
+    message in separate calls; fusing them halves input tokens and saves
+    one full LLM round trip per turn.
+    """
+
+    def __init__(self):
+        self._setup_llm()
+        # Scam campaigns reuse templates verbatim, so identical turns can
+        # skip the fused round trip entirely: an in-process exact-match
+        # LRU backed by an optional Redis tier shared across workers
+        self._fused_cache: OrderedDict[str, tuple[bool, float, str, str]] = OrderedDict()
+        self._cache_lock = asyncio.Lock()
+        if REDIS_AVAILABLE and REDIS_URL:
+            self._redis = aioredis.from_url(REDIS_URL)
+        else:
+            self._redis = None
+
+    @staticmethod
+    def _cache_key(scammer_message: str, history: List[Message], scam_type: str) -> str:
+        """Build a cache key from the message, scam type, and recent history."""
+        history_tail = "".join(m.text for m in history[-3:])
+        raw = f"{scam_type}|{scammer_message}|{history_tail}"
+        return f"fused:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+    async def _cache_get(self, key: str) -> tuple[bool, float, str, str] | None:
+        """Look up a fused result, local LRU first, then shared Redis."""
+        async with self._cache_lock:
+            if key in self._fused_cache:
+                self._fused_cache.move_to_end(key)
+                return self._fused_cache[key]
+        if self._redis is None:
+            return None
+        try:
+            cached = await self._redis.get(key)
+            if cached is None:
+                return None
+            is_scam, confidence, scam_type, reply = json.loads(cached)
+            return bool(is_scam), float(confidence), str(scam_type), str(reply)
+        except Exception as e:
+            # Outages and corrupt entries are both just misses
+            print(f"Fused cache read failed: {e}")
+            return None
+
+    async def _cache_set(self, key: str, result: tuple[bool, float, str, str]) -> None:
+        """Store a fused result in both cache tiers."""
+        async with self._cache_lock:
+            self._fused_cache[key] = result
+            self._fused_cache.move_to_end(key)
+            if len(self._fused_cache) > FUSED_CACHE_SIZE:
+                self._fused_cache.popitem(last=False)
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(key, json.dumps(result), ex=FUSED_CACHE_TTL)
+        except Exception as e:
+            print(f"Fused cache write failed: {e}")
+
+    def _setup_llm(self):
+        """Initialize Gemini LLM."""
+        if GEMINI_API_KEY:
+            genai.configure(api_key=GEMINI_API_KEY)
+            self.model = genai.GenerativeModel(PRIMARY_MODEL)
+            self.backup_model = genai.GenerativeModel(BACKUP_MODEL)
+            self.llm_available = True
+        else:
+            self.llm_available = False
+
+    async def analyze_and_reply(self, scammer_message: str, history: List[Message],
+                                scam_type: str, message_count: int,
+                                keyword_hits: List[str] | None = None
+                                ) -> tuple[bool, float, str, str, str]:
+        """
+        Detect scam intent and generate the engagement reply in one call.
+
+        keyword_hits carries keywords already found by the intelligence
+        extractor's pass over this message, so the detector's heuristic
+        fallback never scans the same bytes twice.
+
+        Returns:
+            Tuple of (is_scam, confidence, scam_type, reply, agent_note)
+        """
+        if not self.llm_available:
+            return await self._unfused(scammer_message, history, scam_type,
+                                       message_count, keyword_hits)
+
+        cache_key = self._cache_key(scammer_message, history, scam_type)
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            is_scam, confidence, detected_type, reply = cached
+            note = f"Cached fused verdict+reply | Scam type: {detected_type}"
+            return is_scam, confidence, detected_type, reply, note
+
+        # The caller passes an append-only window (see
+        # SessionManager.get_history_window), so use it as-is rather than
+        # re-slicing and shifting the prompt every turn
+        context = ""
+        if history:
+            context = "\n".join([f"{'Caller' if m.sender == 'scammer' else 'You'}: {m.text}"
+                                for m in history])
+
+        prompt = f"""{_STATIC_HEADER}
+
+---
+SUSPECTED SCAM TYPE: {scam_type}
+
+{f"CONVERSATION SO FAR:\n{context}" if context else ""}
+
+SCAMMER'S MESSAGE: "{scammer_message}\""""
+
+        try:
+            async with gemini_breaker:
+                response = await generate_with_cascade(
+                    self.model, self.backup_model, prompt,
+                    generation_config={"response_mime_type": "application/json"}
+                )
+            data = json.loads(response.text)
+
+            reply = str(data.get("reply") or "").strip().strip('"\'')
+            if not reply:
+                raise ValueError("empty reply in fused response")
+            if len(reply) > 200:
+                reply = reply[:200].rsplit(' ', 1)[0] + "..."
+
+            is_scam = bool(data.get("is_scam", False))
+            try:
+                confidence = float(data.get("confidence", 0.5))
+            except (TypeError, ValueError):
+                confidence = 0.5
+            detected_type = str(data.get("scam_type") or "unknown").replace(" ", "_")
+            confidence = min(confidence, 1.0)
+
+            await self._cache_set(cache_key,
+                                  (is_scam, confidence, detected_type, reply))
+            note = f"Fused detect+reply via Gemini | Scam type: {detected_type}"
+            return is_scam, confidence, detected_type, reply, note
+
+        except Exception as e:
+            print(f"Orchestrator error: {e}")
+            return await self._unfused(scammer_message, history, scam_type,
+                                       message_count, keyword_hits)
+
+    async def _unfused(self, scammer_message: str, history: List[Message],
+                       scam_type: str, message_count: int,
+                       keyword_hits: List[str] | None = None
+                       ) -> tuple[bool, float, str, str, str]:
+        """
+        Fall back to the separate detector and agent calls, issued
+        concurrently: the agent only needs a scam type, and the previous
+        turn's type rarely changes mid-session, so neither call has to
+        wait for the other. Wall time drops from sum to max.
+        """
+        (is_scam, confidence, detected_type), (reply, note) = await asyncio.gather(
+            scam_detector.detect(scammer_message, history, keyword_hits),
+            honeypot_agent.generate_response(
+                scammer_message, history, scam_type, message_count
+            ),
+        )
+        return is_scam, confidence, detected_type, reply, note
+
+
+# Global instance
+honeypot_orchestrator = HoneypotOrchestrator()
@@ -1,34 +1,194 @@
 """Scam detection using Gemini LLM."""
 
+import hashlib
+import json
+import re
+
 import google.generativeai as genai
-from .config import GEMINI_API_KEY
+from .circuit_breaker import gemini_breaker
+from .config import GEMINI_API_KEY, REDIS_URL, SCAM_KEYWORDS
+from .llm import PRIMARY_MODEL, BACKUP_MODEL, generate_with_cascade
+
+# Optional: pyahocorasick gives a single linear scan over the text instead of
+# one substring scan per keyword
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Optional: Redis shares the detection cache across worker processes, so a
+# scam template seen by one uvicorn worker is a cache hit in all of them
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Detection verdicts for a given message barely change; keep them a day
+DETECT_CACHE_TTL = 86400
 
 
 class ScamDetector:
     """Detects scam intent using Gemini LLM."""
-    
+
     def __init__(self):
         self._setup_llm()
-    
+        self._setup_keyword_matcher()
+        if REDIS_AVAILABLE and REDIS_URL:
+            self._redis = aioredis.from_url(REDIS_URL)
+        else:
+            self._redis = None
+
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        """Cache key from the whitespace-normalized, lowered message."""
+        normalized = " ".join(text.lower().split())
+        return f"scam:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    async def _cache_get(self, text: str) -> tuple[bool, float, str] | None:
+        """Look up a shared cached verdict, tolerating Redis outages."""
+        if self._redis is None:
+            return None
+        try:
+            cached = await self._redis.get(self._cache_key(text))
+        except Exception as e:
+            print(f"Detection cache read failed: {e}")
+            return None
+        if cached is None:
+            return None
+        try:
+            is_scam, confidence, scam_type = json.loads(cached)
+            return bool(is_scam), float(confidence), str(scam_type)
+        except Exception as e:
+            # A corrupt or schema-drifted entry is just a miss; it must
+            # not poison every request carrying this message for the TTL
+            print(f"Detection cache entry invalid, ignoring: {e}")
+            return None
+
+    async def _cache_set(self, text: str, result: tuple[bool, float, str]) -> None:
+        """Store a verdict in the shared cache, tolerating Redis outages."""
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(
+                self._cache_key(text), json.dumps(result), ex=DETECT_CACHE_TTL
+            )
+        except Exception as e:
+            print(f"Detection cache write failed: {e}")
+
+    def _setup_keyword_matcher(self):
+        """Build the keyword matcher used by _keyword_score."""
+        if AHOCORASICK_AVAILABLE:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in SCAM_KEYWORDS:
+                self._automaton.add_word(keyword.lower(), keyword.lower())
+            self._automaton.make_automaton()
+            self._keyword_regex = None
+        else:
+            # Fallback: one compiled alternation instead of K substring scans
+            self._automaton = None
+            self._keyword_regex = re.compile(
+                "|".join(re.escape(kw.lower()) for kw in SCAM_KEYWORDS)
+            )
+
+    def _keyword_score(self, text: str,
+                       precomputed: list[str] | None = None) -> tuple[float, list[str]]:
+        """
+        Score a message by scam keyword hits in one pass over the text.
+
+        When the caller already scanned the message (the intelligence
+        extractor's fused pass finds the same keywords), its hits are
+        reused instead of walking the text again.
+
+        Returns:
+            Tuple of (confidence, matched_keywords)
+        """
+        if precomputed is not None:
+            found = set(precomputed)
+        elif self._automaton is not None:
+            found = {value for _, value in self._automaton.iter(text.lower())}
+        else:
+            found = set(self._keyword_regex.findall(text.lower()))
+
+        if not found:
+            return 0.0, []
+        confidence = min(0.9, 0.3 + 0.1 * len(found))
+        return confidence, sorted(found)
+
+    @classmethod
+    def _parse_json_detection(cls, result: str) -> tuple[bool, float, str]:
+        """
+        Parse a JSON-mode detection reply, falling back to the line-based
+        parser if the model ignored the JSON instruction.
+        """
+        try:
+            data = json.loads(result)
+        except (json.JSONDecodeError, TypeError):
+            return cls._parse_detection(result)
+        is_scam = bool(data.get("is_scam", False))
+        try:
+            confidence = float(data.get("confidence", 0.5))
+        except (TypeError, ValueError):
+            confidence = 0.5
+        scam_type = str(data.get("scam_type") or "unknown").replace(" ", "_")
+        return is_scam, min(confidence, 1.0), scam_type
+
+    @staticmethod
+    def _parse_detection(result: str) -> tuple[bool, float, str]:
+        """
+        Parse the IS_SCAM/CONFIDENCE/SCAM_TYPE reply in a single pass
+        over the lines instead of re-splitting the whole text per field.
+        """
+        is_scam = False
+        confidence = 0.5
+        scam_type = "unknown"
+        for line in result.lower().splitlines():
+            key, _, value = line.partition(":")
+            key = key.strip()
+            value = value.strip()
+            if key == "is_scam":
+                is_scam = "yes" in value
+            elif key == "confidence":
+                digits = ''.join(c for c in value if c.isdigit() or c == '.')
+                try:
+                    confidence = float(digits)
+                except ValueError:
+                    confidence = 0.5
+            elif key == "scam_type":
+                scam_type = value.replace(" ", "_") or "unknown"
+        return is_scam, min(confidence, 1.0), scam_type
+
     def _setup_llm(self):
         """Initialize Gemini LLM."""
         if GEMINI_API_KEY:
             genai.configure(api_key=GEMINI_API_KEY)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
+            self.model = genai.GenerativeModel(PRIMARY_MODEL)
+            self.backup_model = genai.GenerativeModel(BACKUP_MODEL)
             self.llm_available = True
         else:
             self.llm_available = False
     
-    async def detect(self, text: str, history: list = None) -> tuple[bool, float, str]:
+    async def detect(self, text: str, history: list = None,
+                     keyword_hits: list[str] | None = None) -> tuple[bool, float, str]:
         """
         Detect if message is a scam using Gemini.
-        
+
+        keyword_hits, when given, are keywords already found in the text
+        by an earlier scan; the heuristic paths reuse them rather than
+        re-scanning the same bytes.
+
         Returns:
             Tuple of (is_scam, confidence, scam_type)
         """
         if not self.llm_available:
-            return False, 0.0, "unknown"
-        
+            confidence, keywords = self._keyword_score(text, keyword_hits)
+            return len(keywords) >= 2, confidence, "unknown"
+
+        cached = await self._cache_get(text)
+        if cached is not None:
+            return cached
+
         context = ""
         if history:
             context = "\n".join([f"{m.sender}: {m.text}" for m in history[-5:]])
@@ -39,27 +199,23 @@ class ScamDetector:
 
 Current message: "{text}"
 
-Respond in this exact format:
-IS_SCAM: [yes/no]
-CONFIDENCE: [0.0-1.0]
-SCAM_TYPE: [bank_fraud/upi_fraud/phishing/fake_offer/unknown]"""
+Respond with a JSON object with exactly these keys:
+{{"is_scam": true/false, "confidence": 0.0-1.0, "scam_type": "bank_fraud/upi_fraud/phishing/fake_offer/unknown"}}"""
 
         try:
-            response = await self.model.generate_content_async(prompt)
-            result = response.text
-            
-            # Parse response
-            is_scam = "yes" in result.lower().split("is_scam:")[1].split("\n")[0].lower()
-            confidence_line = result.lower().split("confidence:")[1].split("\n")[0]
-            confidence = float(''.join(c for c in confidence_line if c.isdigit() or c == '.') or "0.5")
-            scam_type_line = result.lower().split("scam_type:")[1].split("\n")[0]
-            scam_type = scam_type_line.strip().replace(" ", "_")
-            
-            return is_scam, min(confidence, 1.0), scam_type
-            
+            async with gemini_breaker:
+                response = await generate_with_cascade(
+                    self.model, self.backup_model, prompt,
+                    generation_config={"response_mime_type": "application/json"}
+                )
+            result = self._parse_json_detection(response.text)
+            await self._cache_set(text, result)
+            return result
+
         except Exception as e:
             print(f"Scam detection error: {e}")
-            return False, 0.0, "unknown"
+            confidence, keywords = self._keyword_score(text, keyword_hits)
+            return len(keywords) >= 2, confidence, "unknown"
 
 
 # Global instance
@@ -1,52 +1,158 @@
 """Session management for multi-turn conversations."""
 
-from typing import Dict, Optional
-from .models import SessionData, Message, ExtractedIntelligence
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, List, Optional
+from .models import SessionData, Message, MessageRec, ExtractedIntelligence
+
+# Optional: xxhash's 64-bit xxh3 is much faster than CPython's siphash on
+# short strings, and the signature sets hold 8-byte ints instead of the
+# strings themselves
+try:
+    import xxhash
+    _intel_signature = xxhash.xxh3_64_intdigest
+    XXHASH_AVAILABLE = True
+except ImportError:
+    _intel_signature = hash
+    XXHASH_AVAILABLE = False
+
+# Bounds on the in-memory session store: without them an attacker sending
+# fresh session ids grows the dict without limit
+MAX_SESSIONS = 10_000
+SESSION_TTL = 3600.0
+
+# Prompt history window: grows from MIN to MAX messages, then resets to the
+# most recent MIN. Between resets every prompt is a strict prefix-extension
+# of the previous one, which keeps the LLM's implicit prefix cache warm.
+HISTORY_WINDOW_MIN = 6
+HISTORY_WINDOW_MAX = 12
 
 
 class SessionManager:
     """Manages conversation sessions in memory."""
-    
+
+    # Fields update_session may write; a frozenset membership test replaces
+    # the old hasattr() probe, which raises and catches AttributeError for
+    # every unknown key
+    _UPDATABLE = frozenset({
+        'scam_detected', 'scam_type', 'confidence', 'callback_sent'
+    })
+
     def __init__(self):
-        self._sessions: Dict[str, SessionData] = {}
-    
+        self._sessions: "OrderedDict[str, SessionData]" = OrderedDict()
+        self._last_seen: Dict[str, float] = {}
+
+    def _evict(self, now: float) -> None:
+        """Drop idle sessions past their TTL, then the LRU past the cap."""
+        while self._sessions:
+            oldest_id = next(iter(self._sessions))
+            expired = now - self._last_seen.get(oldest_id, now) >= SESSION_TTL
+            if expired or len(self._sessions) >= MAX_SESSIONS:
+                del self._sessions[oldest_id]
+                self._last_seen.pop(oldest_id, None)
+            else:
+                break
+
     def get_session(self, session_id: str) -> SessionData:
         """Get or create a session."""
+        now = time.time()
         if session_id not in self._sessions:
+            self._evict(now)
             self._sessions[session_id] = SessionData(session_id=session_id)
+        else:
+            # Recently-used sessions move to the tail of the LRU order
+            self._sessions.move_to_end(session_id)
+        self._last_seen[session_id] = now
         return self._sessions[session_id]
     
     def update_session(self, session_id: str, **kwargs) -> SessionData:
         """Update session data."""
         session = self.get_session(session_id)
         for key, value in kwargs.items():
-            if hasattr(session, key):
+            if key in self._UPDATABLE:
                 setattr(session, key, value)
         return session
     
-    def add_message(self, session_id: str, message: Message) -> int:
+    def add_message(self, session_id: str, message) -> int:
         """Add a message to session history and return new count."""
-        session = self.get_session(session_id)
-        session.conversation_history.append(message)
-        session.message_count = len(session.conversation_history)
+        return self.add_message_obj(self.get_session(session_id), message)
+
+    def add_message_obj(self, session: SessionData, message) -> int:
+        """Add a message to an already-fetched session's history."""
+        # Store history as compact slotted records, not pydantic models
+        if isinstance(message, Message):
+            message = MessageRec.from_message(message)
+        history = session.conversation_history
+        if len(history) == history.maxlen and session.window_start > 0:
+            # A full deque shifts left on append, so the window anchor
+            # must shift with it or the append-only window silently
+            # degenerates into a per-turn sliding window
+            session.window_start -= 1
+        history.append(message)
+        # Increment rather than len(): the deque caps retained history,
+        # but the total exchanged count must keep growing
+        session.message_count += 1
         return session.message_count
     
+    def get_history_window(self, session_id: str) -> List[Message]:
+        """Get the prompt history window for a session by id."""
+        return self.get_history_window_obj(self.get_session(session_id))
+
+    def get_history_window_obj(self, session: SessionData) -> List[Message]:
+        """
+        Get the prompt history window for a session.
+
+        The window only appends until it exceeds HISTORY_WINDOW_MAX, then
+        resets to the last HISTORY_WINDOW_MIN messages, instead of sliding
+        by one message every turn.
+        """
+        history = session.conversation_history
+        if len(history) - session.window_start > HISTORY_WINDOW_MAX:
+            session.window_start = len(history) - HISTORY_WINDOW_MIN
+        return list(islice(history, session.window_start, None))
+
     def add_agent_note(self, session_id: str, note: str) -> None:
         """Add an agent observation note."""
-        session = self.get_session(session_id)
+        self.add_agent_note_obj(self.get_session(session_id), note)
+
+    def add_agent_note_obj(self, session: SessionData, note: str) -> None:
+        """Add an agent observation note to an already-fetched session."""
         session.agent_notes.append(note)
     
+    @staticmethod
+    def _merge_unique(existing: List[str], new: List[str], seen: set) -> None:
+        """Append unseen items in place, preserving first-seen order.
+
+        Membership is tracked by 64-bit signature in the session's
+        persistent seen-set, so repeat merges over long conversations
+        never re-hash items that were folded in on earlier turns.
+        """
+        if not seen and existing:
+            seen.update(_intel_signature(item) for item in existing)
+        for item in new:
+            sig = _intel_signature(item)
+            if sig not in seen:
+                seen.add(sig)
+                existing.append(item)
+
     def update_intelligence(self, session_id: str, intelligence: ExtractedIntelligence) -> None:
         """Merge new intelligence with existing."""
-        session = self.get_session(session_id)
+        self.update_intelligence_obj(self.get_session(session_id), intelligence)
+
+    def update_intelligence_obj(self, session: SessionData,
+                                intelligence: ExtractedIntelligence) -> None:
+        """Merge new intelligence into an already-fetched session."""
         existing = session.intelligence
-        
-        # Merge lists without duplicates
-        existing.bankAccounts = list(set(existing.bankAccounts + intelligence.bankAccounts))
-        existing.upiIds = list(set(existing.upiIds + intelligence.upiIds))
-        existing.phishingLinks = list(set(existing.phishingLinks + intelligence.phishingLinks))
-        existing.phoneNumbers = list(set(existing.phoneNumbers + intelligence.phoneNumbers))
-        existing.suspiciousKeywords = list(set(existing.suspiciousKeywords + intelligence.suspiciousKeywords))
+        seen = session.intel_seen
+
+        # Merge without rebuilding list(set(a + b)) per field: in-place
+        # appends keep discovery order and skip re-hashing old items
+        for bucket in ('bankAccounts', 'upiIds', 'phishingLinks',
+                       'phoneNumbers', 'suspiciousKeywords'):
+            self._merge_unique(getattr(existing, bucket),
+                               getattr(intelligence, bucket),
+                               seen.setdefault(bucket, set()))
     
     def mark_callback_sent(self, session_id: str) -> None:
         """Mark that GUVI callback has been sent."""
@@ -66,6 +172,7 @@ class SessionManager:
         """Remove a session (cleanup)."""
         if session_id in self._sessions:
             del self._sessions[session_id]
+            self._last_seen.pop(session_id, None)
             return True
         return False
     
@@ -9,16 +9,37 @@ from fastapi import FastAPI, HTTPException, Header, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, Dict
 from datetime import datetime, timedelta
-from collections import defaultdict
+from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
 import time
 import json
 
-from app.models import HoneypotRequest, HoneypotResponse, Message
-from app.config import API_KEY
-from app.scam_detector import scam_detector
-from app.agent import honeypot_agent
+from app.models import HoneypotRequest, HoneypotResponse, Message, MessageRec, GuviCallbackPayload
+from app.config import API_KEY, ENGAGEMENT_THRESHOLD, REDIS_URL
+
+# Optional: a Redis-backed limiter enforces limits globally across uvicorn
+# workers instead of per process
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Optional: orjson parses request bodies several times faster than stdlib
+# json and backs ORJSONResponse for response serialization
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as _DefaultResponse
+    _loads = orjson.loads
+except ImportError:
+    from fastapi.responses import JSONResponse as _DefaultResponse
+    _loads = json.loads
+from app.orchestrator import honeypot_orchestrator
 from app.intelligence_extractor import intelligence_extractor
 from app.session_manager import session_manager
+from app.guvi_callback import send_guvi_callback, close_client
 
 
 # ========== RATE LIMITING ==========
@@ -27,70 +48,159 @@ REQUESTS_PER_DAY = 100
 REQUESTS_PER_MINUTE = 10
 
 class RateLimiter:
-    """In-memory rate limiter with RPD and RPM limits."""
-    
+    """
+    In-memory token-bucket rate limiter with RPD and RPM limits.
+
+    Each key holds two (tokens, last_refill) pairs - constant memory per
+    key, O(1) checks, and no cleanup pass over stored timestamps.
+    """
+
     def __init__(self):
-        self.minute_requests: Dict[str, list] = defaultdict(list)
-        self.daily_requests: Dict[str, list] = defaultdict(list)
-    
-    def _cleanup_old_requests(self, key: str):
-        """Remove expired timestamps."""
-        now = time.time()
-        # Clean minute requests (older than 60 seconds)
-        self.minute_requests[key] = [
-            ts for ts in self.minute_requests[key] if now - ts < 60
-        ]
-        # Clean daily requests (older than 24 hours)
-        self.daily_requests[key] = [
-            ts for ts in self.daily_requests[key] if now - ts < 86400
-        ]
-    
-    def check_rate_limit(self, key: str) -> tuple[bool, str]:
+        self.minute_buckets: Dict[str, tuple[float, float]] = {}
+        self.daily_buckets: Dict[str, tuple[float, float]] = {}
+
+    @staticmethod
+    def _refill(bucket: Optional[tuple[float, float]], capacity: int,
+                window: float, now: float) -> float:
+        """Tokens available after lazily refilling at capacity/window."""
+        if bucket is None:
+            return float(capacity)
+        tokens, last_refill = bucket
+        return min(float(capacity), tokens + (now - last_refill) * capacity / window)
+
+    async def check_rate_limit(self, key: str) -> tuple[bool, str]:
         """
         Check if request is allowed.
         Returns (allowed, error_message)
         """
-        self._cleanup_old_requests(key)
-        now = time.time()
-        
-        # Check RPM (1 request per minute)
-        if len(self.minute_requests[key]) >= REQUESTS_PER_MINUTE:
-            wait_time = 60 - (now - self.minute_requests[key][0])
-            return False, f"Rate limit exceeded: 1 request per minute. Wait {int(wait_time)} seconds."
-        
-        # Check RPD (10 requests per day)
-        if len(self.daily_requests[key]) >= REQUESTS_PER_DAY:
-            oldest = self.daily_requests[key][0]
-            wait_time = 86400 - (now - oldest)
+        now = time.monotonic()
+
+        minute_tokens = self._refill(self.minute_buckets.get(key),
+                                     REQUESTS_PER_MINUTE, 60.0, now)
+        if minute_tokens < 1:
+            wait_time = (1 - minute_tokens) * 60.0 / REQUESTS_PER_MINUTE
+            return False, f"Rate limit exceeded: {REQUESTS_PER_MINUTE} requests per minute. Wait {int(wait_time)} seconds."
+
+        daily_tokens = self._refill(self.daily_buckets.get(key),
+                                    REQUESTS_PER_DAY, 86400.0, now)
+        if daily_tokens < 1:
+            wait_time = (1 - daily_tokens) * 86400.0 / REQUESTS_PER_DAY
             hours = int(wait_time // 3600)
             minutes = int((wait_time % 3600) // 60)
-            return False, f"Rate limit exceeded: 10 requests per day. Wait {hours}h {minutes}m."
-        
+            return False, f"Rate limit exceeded: {REQUESTS_PER_DAY} requests per day. Wait {hours}h {minutes}m."
+
         return True, ""
-    
-    def record_request(self, key: str):
+
+    async def record_request(self, key: str):
         """Record a successful request."""
+        now = time.monotonic()
+        self.minute_buckets[key] = (
+            self._refill(self.minute_buckets.get(key), REQUESTS_PER_MINUTE, 60.0, now) - 1,
+            now
+        )
+        self.daily_buckets[key] = (
+            self._refill(self.daily_buckets.get(key), REQUESTS_PER_DAY, 86400.0, now) - 1,
+            now
+        )
+
+    async def get_remaining(self, key: str) -> dict:
+        """Get remaining requests."""
+        now = time.monotonic()
+        return {
+            "remaining_per_minute": int(self._refill(
+                self.minute_buckets.get(key), REQUESTS_PER_MINUTE, 60.0, now)),
+            "remaining_per_day": int(self._refill(
+                self.daily_buckets.get(key), REQUESTS_PER_DAY, 86400.0, now))
+        }
+
+# Prune expired entries and return the current window count in one
+# round trip; checking never writes an admission entry
+_WINDOW_COUNT_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, tonumber(ARGV[1]) - tonumber(ARGV[2]))
+return redis.call('ZCARD', KEYS[1])
+"""
+
+# Record an admitted request and refresh the key's expiry
+_WINDOW_RECORD_LUA = """
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])))
+return 1
+"""
+
+
+class RedisRateLimiter:
+    """
+    Redis-backed sliding-window rate limiter shared across workers.
+
+    The in-memory limiter is per process, so under N uvicorn workers each
+    key effectively gets N times the stated limits. This one keeps the
+    windows in Redis sorted sets. Like the in-memory backend, the check
+    only reads: requests are recorded via record_request after the body
+    validates, so malformed requests never burn quota and a minute entry
+    is never left behind by a daily-window rejection.
+    """
+
+    def __init__(self, url: str):
+        self._redis = aioredis.from_url(url)
+        self._count = self._redis.register_script(_WINDOW_COUNT_LUA)
+        self._record = self._redis.register_script(_WINDOW_RECORD_LUA)
+
+    async def _window_count(self, key: str, window: float) -> int:
+        """Prune the window and return how many requests it holds."""
+        return int(await self._count(keys=[key], args=[time.time(), window]))
+
+    async def check_rate_limit(self, key: str) -> tuple[bool, str]:
+        """
+        Check if request is allowed.
+        Returns (allowed, error_message)
+        """
+        try:
+            if await self._window_count(f"ratelimit:minute:{key}", 60.0) >= REQUESTS_PER_MINUTE:
+                return False, f"Rate limit exceeded: {REQUESTS_PER_MINUTE} requests per minute."
+            if await self._window_count(f"ratelimit:day:{key}", 86400.0) >= REQUESTS_PER_DAY:
+                return False, f"Rate limit exceeded: {REQUESTS_PER_DAY} requests per day."
+        except Exception as e:
+            # Fail open: an unreachable Redis must not take the API down
+            print(f"Redis rate limiter unavailable, allowing request: {e}")
+        return True, ""
+
+    async def record_request(self, key: str):
+        """Record a successful request in both windows."""
         now = time.time()
-        self.minute_requests[key].append(now)
-        self.daily_requests[key].append(now)
-    
-    def get_remaining(self, key: str) -> dict:
+        member = uuid4().hex
+        try:
+            await self._record(keys=[f"ratelimit:minute:{key}"], args=[now, 60.0, member])
+            await self._record(keys=[f"ratelimit:day:{key}"], args=[now, 86400.0, member])
+        except Exception as e:
+            print(f"Redis rate limiter record failed: {e}")
+
+    async def get_remaining(self, key: str) -> dict:
         """Get remaining requests."""
-        self._cleanup_old_requests(key)
+        try:
+            minute_used = await self._redis.zcard(f"ratelimit:minute:{key}")
+            daily_used = await self._redis.zcard(f"ratelimit:day:{key}")
+        except Exception:
+            minute_used = daily_used = 0
         return {
-            "remaining_per_minute": REQUESTS_PER_MINUTE - len(self.minute_requests[key]),
-            "remaining_per_day": REQUESTS_PER_DAY - len(self.daily_requests[key])
+            "remaining_per_minute": max(0, REQUESTS_PER_MINUTE - minute_used),
+            "remaining_per_day": max(0, REQUESTS_PER_DAY - daily_used)
         }
 
-# Global rate limiter instance
-rate_limiter = RateLimiter()
+
+# Global rate limiter instance: shared Redis window when configured,
+# per-process token buckets otherwise
+if REDIS_AVAILABLE and REDIS_URL:
+    rate_limiter = RedisRateLimiter(REDIS_URL)
+else:
+    rate_limiter = RateLimiter()
 
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Agentic Honey-Pot API",
     description="AI-powered honeypot for scam detection and intelligence extraction",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=_DefaultResponse
 )
 
 # CORS configuration
@@ -115,7 +225,7 @@ async def verify_api_key(x_api_key: str = Header(...)):
 
 async def check_rate_limit(x_api_key: str = Header(...)):
     """Check rate limits for the API key."""
-    allowed, error_msg = rate_limiter.check_rate_limit(x_api_key)
+    allowed, error_msg = await rate_limiter.check_rate_limit(x_api_key)
     if not allowed:
         raise HTTPException(
             status_code=429,
@@ -124,6 +234,21 @@ async def check_rate_limit(x_api_key: str = Header(...)):
     return x_api_key
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Size the default executor that asyncio.to_thread dispatches to."""
+    # The default executor allows min(32, cpu+4) threads - far more than
+    # useful for GIL-bound regex work; cap it at the core count
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=os.cpu_count()))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the pooled GUVI callback client."""
+    await close_client()
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -159,10 +284,11 @@ async def honeypot_endpoint(
         if not body_bytes:
             raise HTTPException(status_code=400, detail="Empty request body")
             
-        # Manually parse JSON
+        # Manually parse JSON (orjson when available)
         try:
-            body_data = json.loads(body_bytes)
-        except json.JSONDecodeError:
+            body_data = _loads(body_bytes)
+        except ValueError:
+            # Covers both json.JSONDecodeError and orjson.JSONDecodeError
             raise HTTPException(status_code=400, detail="Invalid JSON format")
             
         # Validate against Pydantic model
@@ -180,30 +306,60 @@ async def honeypot_endpoint(
     # =========================================================================
     
     # Record this request for rate limiting
-    rate_limiter.record_request(api_key)
+    await rate_limiter.record_request(api_key)
     
     session_id = request.sessionId
     current_message = request.message
     history = request.conversationHistory or []
     
-    # Get or create session
+    # Get or create session once; helpers below reuse the object instead
+    # of re-resolving the session id per call
     session = session_manager.get_session(session_id)
-    
+
     # Add incoming message to session
-    session_manager.add_message(session_id, current_message)
-    
+    session_manager.add_message_obj(session, current_message)
+
     # Also add any history that's not already tracked
     if history and len(session.conversation_history) <= 1:
         for msg in history:
-            if msg not in session.conversation_history:
-                session_manager.add_message(session_id, msg)
-    
-    # Step 1: Detect scam intent
-    is_scam, confidence, scam_type = await scam_detector.detect(
-        current_message.text,
-        session.conversation_history
-    )
-    
+            rec = MessageRec.from_message(msg)
+            if rec not in session.conversation_history:
+                session_manager.add_message_obj(session, rec)
+
+    # Steps 1+2: Extract intelligence and run the fused detect+reply call.
+    # With the LLM configured, extraction (pure CPU) runs in a worker
+    # thread concurrently with the Gemini round trip, so its cost hides
+    # entirely inside the network wait. Without the LLM the orchestrator
+    # answers from the keyword heuristic immediately, so extraction runs
+    # first and its fused scan feeds the detector's keyword hits - the
+    # message bytes are only traversed once
+    window = session_manager.get_history_window_obj(session)
+    if honeypot_orchestrator.llm_available:
+        (is_scam, confidence, scam_type, reply, agent_note), intel = await asyncio.gather(
+            honeypot_orchestrator.analyze_and_reply(
+                current_message.text,
+                window,
+                session.scam_type or "unknown",
+                session.message_count
+            ),
+            asyncio.to_thread(
+                intelligence_extractor.extract_from_text, current_message.text
+            ),
+        )
+    else:
+        # Still off-loop: regex over a long hostile message must not
+        # stall the event loop for other requests
+        intel = await asyncio.to_thread(
+            intelligence_extractor.extract_from_text, current_message.text
+        )
+        is_scam, confidence, scam_type, reply, agent_note = await honeypot_orchestrator.analyze_and_reply(
+            current_message.text,
+            window,
+            session.scam_type or "unknown",
+            session.message_count,
+            keyword_hits=intel.suspiciousKeywords
+        )
+
     # Update session with scam detection results
     if is_scam and confidence > session.confidence:
         session_manager.update_session(
@@ -212,43 +368,47 @@ async def honeypot_endpoint(
             scam_type=scam_type,
             confidence=confidence
         )
-        session_manager.add_agent_note(
-            session_id,
+        session_manager.add_agent_note_obj(
+            session,
             f"Scam detected: {scam_type} (confidence: {confidence:.2f})"
         )
-    
-    # Step 2: Extract intelligence from current message
-    intel = intelligence_extractor.extract_from_text(current_message.text)
-    session_manager.update_intelligence(session_id, intel)
-    
+
+    # Merge the extracted intelligence into the session
+    session_manager.update_intelligence_obj(session, intel)
+
     # Log extracted intelligence
     if any([intel.bankAccounts, intel.upiIds, intel.phishingLinks, intel.phoneNumbers]):
-        session_manager.add_agent_note(
-            session_id,
+        session_manager.add_agent_note_obj(
+            session,
             f"Extracted: {len(intel.bankAccounts)} accounts, {len(intel.upiIds)} UPIs, "
             f"{len(intel.phishingLinks)} links, {len(intel.phoneNumbers)} phones"
         )
-    
-    # Step 3: Generate agent response using Gemini AI
-    # Always use the AI agent for responses, regardless of scam detection
-    reply, agent_note = await honeypot_agent.generate_response(
-        current_message.text,
-        session.conversation_history,
-        session.scam_type or scam_type or "unknown",
-        session_manager.get_message_count(session_id)
-    )
-    session_manager.add_agent_note(session_id, agent_note)
-    
+
+    # Step 3: Record the agent response generated by the fused call
+    session_manager.add_agent_note_obj(session, agent_note)
+
     # Add agent's response to conversation history
     agent_message = Message(
         sender="user",
         text=reply,
         timestamp=current_message.timestamp
     )
-    session_manager.add_message(session_id, agent_message)
-    
+    session_manager.add_message_obj(session, agent_message)
+
+    # Step 4: Send GUVI callback once the engagement is deep enough
+    if (session.scam_detected
+            and not session.callback_sent
+            and session.message_count >= ENGAGEMENT_THRESHOLD):
+        payload = GuviCallbackPayload(
+            sessionId=session_id,
+            scamDetected=session.scam_detected,
+            totalMessagesExchanged=session.message_count,
+            extractedIntelligence=session.intelligence,
+            agentNotes=session_manager.get_agent_notes_summary(session_id)
+        )
+        if await send_guvi_callback(payload):
+            session_manager.mark_callback_sent(session_id)
 
-    
     return HoneypotResponse(
         status="success",
         reply=reply
@@ -279,7 +439,7 @@ async def get_rate_limit_status(
     api_key: str = Depends(verify_api_key)
 ):
     """Get rate limit status for the API key."""
-    remaining = rate_limiter.get_remaining(api_key)
+    remaining = await rate_limiter.get_remaining(api_key)
     return {
         "limits": {
             "requests_per_minute": REQUESTS_PER_MINUTE,